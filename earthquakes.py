@@ -4,52 +4,296 @@
 # This is external library that you may need to install first.
 
 
+import asyncio
+import hashlib
 import json
+import logging
+import numpy as np
 import requests
-from typing import Any, Dict, List, Tuple
-from collections import defaultdict
-from math import isnan
+import shutil
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+import matplotlib
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.ticker import MaxNLocator
-from datetime import date
-from typing import Optional, List, Dict
+from datetime import datetime, timezone
+from pathlib import Path
+
+__all__ = [
+    "Columns",
+    "YearlyStats",
+    "aggregate",
+    "count_earthquakes",
+    "get_columns",
+    "get_data",
+    "get_data_batch",
+    "get_location",
+    "get_magnitude",
+    "get_magnitudes_per_year",
+    "get_maximum",
+    "get_maximum_fast",
+    "get_year",
+    "iter_features",
+    "plot_average_magnitude_per_year",
+    "plot_number_per_year",
+    "to_columns",
+]
+
+try:
+    import aiohttp
+except ImportError:  # optional: fall back to a single synchronous request
+    aiohttp = None
+
+try:
+    import ijson
+except ImportError:  # optional: fall back to parsing the whole document
+    ijson = None
+
+try:
+    from numba import njit
+except ImportError:  # optional: _group_sum_count falls back to np.bincount
+    njit = None
+
+try:
+    import msgspec
+except ImportError:  # optional: get_columns falls back to dict parsing + to_columns
+    msgspec = None
+
+try:
+    import orjson
+    _loads, _dumps = orjson.loads, orjson.dumps
+except ImportError:  # optional: the stdlib decoder also accepts bytes
+    _loads = json.loads
+
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+
+try:
+    import brotli  # noqa: F401  (registers "br" decoding with urllib3/aiohttp)
+    _ACCEPT_ENCODING = "br, gzip"
+except ImportError:
+    _ACCEPT_ENCODING = "gzip"
+
+logger = logging.getLogger(__name__)
+
+USGS_URL = "https://earthquake.usgs.gov/fdsnws/event/1/query"
+USGS_PARAMS: Dict[str, str] = {
+    "format": "geojson",
+    "starttime": "2000-01-01",
+    "endtime": "2018-10-11",
+    "minlatitude": "50.008",
+    "maxlatitude": "58.723",
+    "minlongitude": "-9.756",
+    "maxlongitude": "1.67",
+    "minmagnitude": "1",
+    "orderby": "time-asc",
+}
+CACHE_DIR = Path(".cache")
+PLOT_CACHE_DIR = Path(".plotcache")
+# Bump whenever the plot code changes how figures look, so stale renders are not reused.
+_PLOT_RENDER_VERSION = 1
+_PLOT_CACHE_MAX_FILES = 32
+
+# One shared session so repeated calls reuse the pooled TLS connection,
+# with retries/backoff for the transient gateway errors USGS sometimes returns.
+_RETRIES = 3
+_BACKOFF = 0.5
+_RETRY_STATUSES = (502, 503, 504)
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(total=_RETRIES, backoff_factor=_BACKOFF, status_forcelist=_RETRY_STATUSES),
+    ),
+)
+_SESSION.headers.update({"Accept-Encoding": _ACCEPT_ENCODING})
+
+
+def _cache_paths(params: Dict[str, str]) -> Tuple[Path, Path]:
+    """Return (body, etag) cache file paths keyed by a hash of the query params."""
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return CACHE_DIR / f"{key}.json", CACHE_DIR / f"{key}.etag"
+
+
+def _write_cache(path: Path, content: bytes) -> None:
+    """Atomically replace ``path`` with ``content`` so an interrupted write never leaves a partial file."""
+    CACHE_DIR.mkdir(exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(content)
+    tmp.replace(path)
+
+
+def _query_url(params: Dict[str, str]) -> str:
+    return requests.Request("GET", USGS_URL, params=params).prepare().url
+
+
+def _year_params(year: int) -> Dict[str, str]:
+    """
+    The USGS query restricted to one calendar year, clipped to the overall window.
 
-def get_data() -> Dict[str, Any]:
+    Both bounds are inclusive at USGS, so each chunk ends on the last millisecond of
+    its year to keep an event at exactly midnight on 1 January out of two chunks.
+    """
+    start = max(f"{year}-01-01", USGS_PARAMS["starttime"])
+    end = min(f"{year}-12-31T23:59:59.999", USGS_PARAMS["endtime"])
+    return {**USGS_PARAMS, "starttime": start, "endtime": end}
+
+
+async def _fetch_year(session, semaphore: asyncio.Semaphore, year: int) -> Dict[str, Any]:
+    """One year's FeatureCollection, retried with backoff like ``_SESSION``."""
+    async with semaphore:
+        for attempt in range(_RETRIES + 1):
+            last_attempt = attempt == _RETRIES
+            try:
+                async with session.get(USGS_URL, params=_year_params(year)) as response:
+                    if last_attempt or response.status not in _RETRY_STATUSES:
+                        response.raise_for_status()
+                        return _parse(await response.read())
+            except aiohttp.ClientConnectionError:
+                if last_attempt:
+                    raise
+            await asyncio.sleep(_BACKOFF * 2**attempt)
+
+
+async def _gather_all(max_concurrency: int = 8) -> Dict[str, Any]:
+    """Fetch every year of the query window concurrently and merge into one FeatureCollection."""
+    first = int(USGS_PARAMS["starttime"][:4])
+    last = int(USGS_PARAMS["endtime"][:4])
+    semaphore = asyncio.Semaphore(max_concurrency)
+    connector = aiohttp.TCPConnector(limit_per_host=max_concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+    headers = {"Accept-Encoding": _ACCEPT_ENCODING}
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=timeout, headers=headers
+    ) as session:
+        chunks = await asyncio.gather(
+            *[_fetch_year(session, semaphore, y) for y in range(first, last + 1)]
+        )
+
+    # gather() preserves order, so per-year chunks concatenate back into time-asc order.
+    features = [f for chunk in chunks for f in chunk["features"]]
+    metadata = {
+        **chunks[-1].get("metadata", {}),
+        "url": _query_url(USGS_PARAMS),
+        "count": len(features),
+    }
+    return {"type": "FeatureCollection", "metadata": metadata, "features": features}
+
+
+def _can_run_async() -> bool:
+    """True if aiohttp is available and we are not already inside an event loop (e.g. Jupyter)."""
+    if aiohttp is None:
+        return False
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return True
+    return False
+
+
+def get_data(refresh: bool = False) -> Dict[str, Any]:
     """
     Fetch earthquakes as GeoJSON from the USGS FDSN Event API and parse to Python types.
 
+    The query window is fixed, so the raw response body is cached under ``.cache/``
+    keyed by the query parameters and reused without touching the network.
+    With ``refresh=True`` an existing cache is revalidated with ``If-None-Match`` and
+    kept if the server answers HTTP 304. When there is nothing cached yet and ``aiohttp``
+    is installed, each year is fetched concurrently (unless an event loop is already
+    running, as in Jupyter); otherwise a single request is made.
+
     Returns:
         A Python dict representing the GeoJSON FeatureCollection.
         See USGS GeoJSON doc: features[i].properties.mag; features[i].geometry.coordinates = [lon, lat, depth].
     """
-    
-    response = requests.get(
-        "https://earthquake.usgs.gov/fdsnws/event/1/query",
-        params={
-            "format": "geojson",      
-            "starttime": "2000-01-01",
-            "endtime": "2018-10-11",
-            "minlatitude": "50.008",
-            "maxlatitude": "58.723",
-            "minlongitude": "-9.756",
-            "maxlongitude": "1.67",
-            "minmagnitude": "1",
-            "orderby": "time-asc",    
-        },
-        timeout=30,
-    )
+    content, data = _fetch_body(refresh)
+    return data if data is not None else _parse(content)
+
+
+def _fetch_body(refresh: bool = False) -> Tuple[bytes, Optional[Dict[str, Any]]]:
+    """
+    Raw GeoJSON bytes for the query, from the on-disk cache or USGS (see ``get_data``).
+
+    A fresh download has to be decoded anyway before it is cached, so that parsed
+    dict is returned alongside the bytes; it is None when the bytes came from disk.
+    """
+    body_path, etag_path = _cache_paths(USGS_PARAMS)
+    headers = {}
+    if body_path.exists():
+        if not refresh:
+            return body_path.read_bytes(), None
+        if etag_path.exists():
+            headers["If-None-Match"] = etag_path.read_text().strip()
+
+    if not body_path.exists() and _can_run_async():
+        data = asyncio.run(_gather_all())
+        content = _dumps(data)
+        _write_cache(body_path, content)
+        if etag_path.exists():
+            etag_path.unlink()
+        return content, data
+
+    response = _SESSION.get(USGS_URL, params=USGS_PARAMS, headers=headers, timeout=30)
+
+    if response.status_code == 304:
+        return body_path.read_bytes(), None
+
     response.raise_for_status()
+    logger.debug("USGS Content-Encoding: %s", response.headers.get("Content-Encoding"))
+    data = _parse(response.content)  # never cache a truncated or malformed body
+    _write_cache(body_path, response.content)
+    etag = response.headers.get("ETag")
+    if etag:
+        _write_cache(etag_path, etag.encode())
+    elif etag_path.exists():
+        etag_path.unlink()
 
-    
-    data = response.json()  
+    return response.content, data
 
-    
+
+def _parse(content: bytes) -> Dict[str, Any]:
+    """
+    Decode a GeoJSON response body and check it looks like a FeatureCollection.
+
+    Takes the raw bytes rather than ``response.text``/``response.json()``: USGS always
+    serves UTF-8, so there is no need for requests' charset detection or a str round-trip.
+    """
+    data = _loads(content)
     if not isinstance(data, dict) or "features" not in data:
         raise ValueError("Unexpected response structure (no 'features' in GeoJSON).")
 
     return data
 
 
+def iter_features() -> Iterator[Dict[str, Any]]:
+    """
+    Yield earthquake features one at a time without materialising the whole GeoJSON.
+
+    Streams from the on-disk cache if present, otherwise straight off the socket.
+    Falls back to ``get_data()["features"]`` when ``ijson`` is not installed.
+    """
+    if ijson is None:
+        yield from get_data()["features"]
+        return
+
+    body_path, _ = _cache_paths(USGS_PARAMS)
+    if body_path.exists():
+        with body_path.open("rb") as f:
+            yield from ijson.items(f, "features.item", use_float=True)
+        return
+
+    with _SESSION.get(USGS_URL, params=USGS_PARAMS, stream=True, timeout=30) as response:
+        response.raise_for_status()
+        logger.debug("USGS Content-Encoding: %s", response.headers.get("Content-Encoding"))
+        response.raw.decode_content = True  # let urllib3 undo gzip/br before ijson sees it
+        yield from ijson.items(response.raw, "features.item", use_float=True)
+
+
 def count_earthquakes(data: Dict[str, Any]) -> int:
     """Get the total number of earthquakes in the response."""
     
@@ -79,21 +323,54 @@ def get_location(earthquake: Dict[str, Any]) -> Tuple[float, float]:
     return float(lat), float(lon)
 
 
-def get_maximum(data: Dict[str, Any]) -> Tuple[float, Tuple[float, float]]:
+def get_maximum(
+    data: Union[Dict[str, Any], Iterable[Dict[str, Any]]]
+) -> Tuple[float, Tuple[float, float]]:
     """
     Find the strongest earthquake: return (max_magnitude, (lat, lon)).
 
+    Accepts either the GeoJSON dict or any iterable of features (e.g. ``iter_features()``).
+    Lists are scanned with ``np.nanargmax``; other iterables are consumed in a single pass.
     Skips features with missing magnitudes (None/NaN).
     """
-    features: List[Dict[str, Any]] = data.get("features", [])
+    features = data.get("features", []) if isinstance(data, dict) else data
+    if not isinstance(features, list):
+        return _get_maximum_streaming(features)
     if not features:
         raise ValueError("No earthquake features in data.")
 
-    
+    mags = np.fromiter((get_magnitude(f) for f in features), dtype=np.float64, count=len(features))
+    try:
+        i = int(np.nanargmax(mags))
+    except ValueError:
+        raise ValueError("No features contained a valid magnitude.") from None
+
+    return float(mags[i]), get_location(features[i])
+
+
+def get_maximum_fast(params: Optional[Dict[str, str]] = None) -> Tuple[float, Tuple[float, float]]:
+    """
+    Like ``get_maximum`` but lets USGS pick the strongest event server-side.
+
+    Reissues the query (``USGS_PARAMS`` by default) with ``orderby=magnitude&limit=1``,
+    so only a single feature is downloaded and parsed.
+    """
+    query = {**(params or USGS_PARAMS), "orderby": "magnitude", "limit": "1"}
+    response = _SESSION.get(USGS_URL, params=query, timeout=30)
+    response.raise_for_status()
+    return get_maximum(_parse(response.content))
+
+
+def _get_maximum_streaming(
+    features: Iterable[Dict[str, Any]]
+) -> Tuple[float, Tuple[float, float]]:
+    """Single-pass version of ``get_maximum`` for iterators that cannot be indexed."""
     max_feature = None
     max_mag = float("-inf")
+    seen = False
 
     for f in features:
+        seen = True
         m = get_magnitude(f)
         if m != m:   
             continue
@@ -101,6 +378,8 @@ def get_maximum(data: Dict[str, Any]) -> Tuple[float, Tuple[float, float]]:
             max_mag = m
             max_feature = f
 
+    if not seen:
+        raise ValueError("No earthquake features in data.")
     if max_feature is None:
         raise ValueError("No features contained a valid magnitude.")
 
@@ -108,93 +387,405 @@ def get_maximum(data: Dict[str, Any]) -> Tuple[float, Tuple[float, float]]:
     return max_mag, max_loc
 
 
-
-if __name__ == "__main__":
-    data = get_data()
-    print(f"Loaded {count_earthquakes(data)} earthquakes")
-    max_magnitude, max_location = get_maximum(data)
-    print(f"The strongest earthquake was at {max_location} with magnitude {max_magnitude}")
-
-
 def get_year(earthquake: dict) -> int:
-    """Extract the calendar year from a USGS earthquake feature."""
-   
-    
+    """Extract the calendar (UTC) year from a USGS earthquake feature."""
     ts_ms = earthquake.get("properties", {}).get("time")
     if ts_ms is None:
         raise ValueError("Feature has no 'properties.time'.")
-    return date.fromtimestamp(ts_ms / 1000).year
+    return time.gmtime(ts_ms // 1000).tm_year
 
 
-def get_magnitudes_per_year(earthquakes: list[dict]) -> dict[int, list[float]]:
-    """Group magnitudes by year: {year: [m1, m2, ...]}."""
-    by_year: dict[int, list[float]] = defaultdict(list)
-    for eq in earthquakes:
-        try:
-            y = get_year(eq)
-        except Exception:
-            continue
-        by_year[y].append(get_magnitude(eq))
-    return dict(by_year)
+class Columns(NamedTuple):
+    """Structure-of-arrays view of the features: one float64 array per field, NaN where missing."""
+
+    mags: np.ndarray
+    times_ms: np.ndarray
+    lats: np.ndarray
+    lons: np.ndarray
+
+
+def _row(earthquake: Dict[str, Any]) -> Tuple[float, float, float, float]:
+    props = earthquake.get("properties") or {}
+    coords = (earthquake.get("geometry") or {}).get("coordinates") or ()
+    mag, ts_ms = props.get("mag"), props.get("time")
+    lat, lon = (coords[1], coords[0]) if len(coords) >= 2 else (None, None)
+    return tuple(float("nan") if v is None else v for v in (mag, ts_ms, lat, lon))
+
+
+def _rows_to_columns(rows: List[Tuple[float, float, float, float]]) -> Columns:
+    table = np.array(rows, dtype=np.float64).reshape(-1, 4)
+    return Columns(*(np.ascontiguousarray(col) for col in table.T))
+
+
+def to_columns(earthquakes: Iterable[Dict[str, Any]]) -> Columns:
+    """Walk the features once and return their fields as columnar NumPy arrays."""
+    return _rows_to_columns([_row(eq) for eq in earthquakes])
+
+
+if msgspec is not None:
+    # Typed schema for the few GeoJSON fields we use; msgspec skips everything else
+    # while decoding, so no intermediate dicts are built for the features.
+
+    class _Properties(msgspec.Struct):
+        mag: Optional[float] = None
+        time: Optional[int] = None
+
+    # Nullable wherever to_columns tolerates a null, so both extractors agree.
+    class _Geometry(msgspec.Struct):
+        coordinates: Optional[List[float]] = None
+
+    class _Feature(msgspec.Struct):
+        properties: Optional[_Properties] = None
+        geometry: Optional[_Geometry] = None
+
+    class _FeatureCollection(msgspec.Struct):
+        features: List[_Feature]
+
+    _decoder = msgspec.json.Decoder(_FeatureCollection)
+
+
+def _struct_row(feature: "_Feature") -> Tuple[float, float, float, float]:
+    nan = float("nan")
+    mag = ts_ms = None
+    if feature.properties is not None:
+        mag, ts_ms = feature.properties.mag, feature.properties.time
+    coords = (feature.geometry.coordinates if feature.geometry is not None else None) or ()
+    lat, lon = (coords[1], coords[0]) if len(coords) >= 2 else (nan, nan)
+    return (
+        nan if mag is None else mag,
+        nan if ts_ms is None else ts_ms,
+        lat,
+        lon,
+    )
+
+
+def get_columns(refresh: bool = False) -> Columns:
+    """
+    Fetch the earthquakes (as ``get_data`` does) straight into columnar arrays.
+
+    With ``msgspec`` installed a cached body is decoded into typed structs instead of
+    dicts; otherwise (or right after a download, which is already parsed) this is
+    ``to_columns(get_data()["features"])``.
+    """
+    content, data = _fetch_body(refresh)
+    if data is not None or msgspec is None:
+        return to_columns((data if data is not None else _parse(content))["features"])
+    return _rows_to_columns([_struct_row(f) for f in _decoder.decode(content).features])
+
+
+def _as_columns(earthquakes: Union[Iterable[Dict[str, Any]], Columns]) -> Columns:
+    return earthquakes if isinstance(earthquakes, Columns) else to_columns(earthquakes)
+
+
+# Range filters that get_data_batch can merge into one wider query and re-apply locally,
+# mapped to how the union widens each of them.
+_BATCH_RANGES = {
+    "starttime": min,
+    "endtime": max,
+    "minlatitude": min,
+    "maxlatitude": max,
+    "minlongitude": min,
+    "maxlongitude": max,
+    "minmagnitude": min,
+}
+# Give up on merging if the union query covers more than this many times the
+# space-time volume of the individual queries (e.g. two distant regions or years),
+# since it would download mostly unwanted events and can hit the 20,000-event limit.
+_BATCH_MAX_OVERFETCH = 2.0
+
+
+def _fetch_query(params: Dict[str, str]) -> Dict[str, Any]:
+    response = _SESSION.get(USGS_URL, params=params, timeout=30)
+    response.raise_for_status()
+    return _parse(response.content)
+
+
+def _time_ms(value: str) -> int:
+    """Epoch milliseconds for an FDSN time string (date or ISO datetime, UTC unless zoned)."""
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    stamp = datetime.fromisoformat(value)
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return int(stamp.timestamp() * 1000)
+
+
+def _volume(query: Dict[str, str]) -> float:
+    """Lat span x lon span x time span covered by ``query``, using the USGS defaults."""
+    lat = float(query.get("maxlatitude", 90)) - float(query.get("minlatitude", -90))
+    lon = float(query.get("maxlongitude", 180)) - float(query.get("minlongitude", -180))
+    end = _time_ms(query["endtime"]) if "endtime" in query else time.time() * 1000
+    return max(lat, 0.0) * min(max(lon, 0.0), 360.0) * max(end - _time_ms(query["starttime"]), 0.0)
+
+
+def _union_query(queries: List[Dict[str, str]]) -> Optional[Dict[str, str]]:
+    """
+    One query covering all of ``queries``, or None if they should not be merged.
+
+    They are merged only if they differ in nothing but their ranges, all give a
+    ``starttime`` (USGS defaults a missing one to 30 days ago, which is not an open
+    bound), and the union does not cover much more than the queries themselves.
+    """
+    fixed = [{k: v for k, v in q.items() if k not in _BATCH_RANGES} for q in queries]
+    # limit/offset would apply to the union's result set, not to each query's share of it.
+    if any(f != fixed[0] for f in fixed) or "limit" in fixed[0] or "offset" in fixed[0]:
+        return None
+    if not all("starttime" in q for q in queries):
+        return None
+
+    union = dict(fixed[0])
+    for key, widest in _BATCH_RANGES.items():
+        # Apart from starttime, a missing bound means unbounded, so it only
+        # survives into the union if every query has one.
+        if all(key in q for q in queries):
+            values = [q[key] for q in queries]
+            union[key] = widest(values, key=_time_ms if key.endswith("time") else float)
+    if "minlongitude" in union and "maxlongitude" in union:
+        if float(union["maxlongitude"]) - float(union["minlongitude"]) >= 360:
+            del union["minlongitude"], union["maxlongitude"]
+
+    if _volume(union) > _BATCH_MAX_OVERFETCH * sum(_volume(q) for q in queries):
+        return None
+    return union
+
+
+def _select(columns: Columns, query: Dict[str, str]) -> np.ndarray:
+    """Indices of the rows in ``columns`` that ``query`` would have returned."""
+    keep = np.ones(len(columns.mags), dtype=bool)
+    if "starttime" in query:
+        keep &= columns.times_ms >= _time_ms(query["starttime"])
+    if "endtime" in query:
+        keep &= columns.times_ms <= _time_ms(query["endtime"])
+    if "minlatitude" in query:
+        keep &= columns.lats >= float(query["minlatitude"])
+    if "maxlatitude" in query:
+        keep &= columns.lats <= float(query["maxlatitude"])
+    if "minmagnitude" in query:
+        keep &= columns.mags >= float(query["minmagnitude"])
+
+    # Longitudes may run past +-180 to cross the dateline (e.g. 170..190), so
+    # compare modulo 360 from the western edge.
+    west = float(query.get("minlongitude", -180))
+    width = float(query.get("maxlongitude", 180)) - west
+    if width < 360:
+        keep &= np.mod(columns.lons - west, 360) <= width
+    return np.flatnonzero(keep)
+
+
+def get_data_batch(queries: List[Dict[str, str]], min_queries: int = 4) -> List[Dict[str, Any]]:
+    """
+    Run several USGS queries (e.g. ``USGS_PARAMS`` over different regions or windows).
+
+    The event service has no multi-selection POST, so for ``min_queries`` or more
+    queries a single request covering their union is made and each query's features
+    are picked out client-side. Smaller batches, queries that cannot be merged (see
+    ``_union_query``), and a failed union request fall back to one request per query.
+    The default of 4 is a conservative guess, not a measured break-even point.
+    """
+    union = _union_query(queries) if len(queries) >= min_queries else None
+    if union is None:
+        return [_fetch_query(q) for q in queries]
+
+    try:
+        merged = _fetch_query(union)
+    except requests.HTTPError as exc:
+        logger.debug("Union query failed (%s); fetching queries one by one", exc)
+        return [_fetch_query(q) for q in queries]
+
+    features = merged["features"]
+    columns = to_columns(features)
+    results = []
+    for q in queries:
+        selected = [features[i] for i in _select(columns, q)]
+        metadata = {**merged.get("metadata", {}), "url": _query_url(q), "count": len(selected)}
+        results.append({"type": "FeatureCollection", "metadata": metadata, "features": selected})
+    return results
+
+
+def _years_and_mags(columns: Columns) -> Tuple[np.ndarray, np.ndarray]:
+    """(UTC year, magnitude) arrays for every event that has a time."""
+    has_time = ~np.isnan(columns.times_ms)
+    stamps = columns.times_ms[has_time].astype("datetime64[ms]")
+    years = stamps.astype("datetime64[Y]").astype(np.int64) + 1970
+    return years, columns.mags[has_time]
+
+
+def get_magnitudes_per_year(
+    earthquakes: Union[Iterable[dict], Columns]
+) -> dict[int, list[float]]:
+    """Group magnitudes by year: {year: [m1, m2, ...]}; accepts features or ``Columns``."""
+    years, mags = _years_and_mags(_as_columns(earthquakes))
+    order = np.argsort(years, kind="stable")
+    uniq, starts = np.unique(years[order], return_index=True)
+    groups = np.split(mags[order], starts[1:])
+    return {int(y): g.tolist() for y, g in zip(uniq, groups)}
+
+
+def _group_sum_count_loop(offsets, mags, valid, span):
+    """Per-bin (sum of valid mags, number of valid mags, number of events), as a plain loop."""
+    sums = np.zeros(span)
+    valid_counts = np.zeros(span, np.int64)
+    counts = np.zeros(span, np.int64)
+    for i in range(offsets.size):
+        k = offsets[i]
+        counts[k] += 1
+        if valid[i]:
+            sums[k] += mags[i]
+            valid_counts[k] += 1
+    return sums, valid_counts, counts
+
+
+def _group_sum_count_bincount(offsets, mags, valid, span):
+    """Same result as ``_group_sum_count_loop``, computed with np.bincount."""
+    sums = np.bincount(offsets[valid], weights=mags[valid], minlength=span)
+    valid_counts = np.bincount(offsets[valid], minlength=span)
+    counts = np.bincount(offsets, minlength=span)
+    return sums, valid_counts, counts
+
+
+# The loop is only worth running when numba can compile it.
+if njit is not None:
+    _group_sum_count = njit(cache=True)(_group_sum_count_loop)
+else:
+    _group_sum_count = _group_sum_count_bincount
+
+
+class YearlyStats(NamedTuple):
+    """
+    Per-year aggregates for the plots over a contiguous range of years.
+
+    Years without events have a count of 0; ``means`` is NaN wherever no magnitude was valid.
+    """
+
+    years: np.ndarray
+    counts: np.ndarray
+    means: np.ndarray
+
+
+def aggregate(earthquakes: Union[Iterable[Dict[str, Any]], Columns]) -> YearlyStats:
+    """Compute event counts and mean magnitude per year with bincount-style reductions."""
+    years, mags = _years_and_mags(_as_columns(earthquakes))
+    if not years.size:
+        return YearlyStats(years, np.zeros(0, np.int64), np.zeros(0))
+
+    base = int(years.min())
+    offsets = years - base
+    span = int(offsets.max()) + 1
+    valid = ~np.isnan(mags)  # one vectorised pass instead of an isnan test per event
+    sums, valid_counts, counts = _group_sum_count(offsets, mags, valid, span)
+    means = np.where(valid_counts > 0, sums / np.maximum(valid_counts, 1), np.nan)
+    return YearlyStats(np.arange(base, base + span), counts, means)
+
+
+def _as_stats(earthquakes: Union[Iterable[Dict[str, Any]], Columns, YearlyStats]) -> YearlyStats:
+    return earthquakes if isinstance(earthquakes, YearlyStats) else aggregate(earthquakes)
+
+
+def _plot_cache_path(kind: str, savepath: str, *arrays: np.ndarray) -> Path:
+    """
+    Cache file for a rendered plot.
+
+    Keyed by plot kind, output format, the data shown, ``_PLOT_RENDER_VERSION`` and
+    the matplotlib version, so changes to the plotting code or library re-render.
+    """
+    suffix = Path(savepath).suffix.lower() or ".png"
+    version = f"{_PLOT_RENDER_VERSION}/{matplotlib.__version__}"
+    digest = hashlib.md5(f"{version}/{kind}{suffix}".encode())
+    for a in arrays:
+        digest.update(np.ascontiguousarray(a).tobytes())
+    return PLOT_CACHE_DIR / f"{digest.hexdigest()}{suffix}"
+
+
+def _new_figure(show: bool):
+    """
+    A pyplot-managed figure when it will be shown, otherwise a bare ``Figure``.
+
+    The bare figure renders with Agg regardless of the pyplot backend and is not
+    tracked by pyplot, so nothing leaks when plots are saved in a loop.
+    """
+    if show:
+        return plt.subplots(figsize=(8, 4.8))
+    fig = Figure(figsize=(8, 4.8))
+    return fig, fig.subplots()
+
+
+def _save_plot(fig, savepath: str, cached: Path, dpi: int, force: bool) -> None:
+    """Copy a previous render of the same plot to ``savepath``, or render and cache it."""
+    if cached.exists() and not force:
+        shutil.copyfile(cached, savepath)
+        return
+    fig.savefig(savepath, dpi=dpi, bbox_inches="tight")
+    PLOT_CACHE_DIR.mkdir(exist_ok=True)
+    shutil.copyfile(savepath, cached)
+
+    # Evict the least recently written renders beyond the cap.
+    entries = sorted(PLOT_CACHE_DIR.iterdir(), key=lambda p: p.stat().st_mtime, reverse=True)
+    for stale in entries[_PLOT_CACHE_MAX_FILES:]:
+        stale.unlink()
+
 
 def plot_number_per_year(
-    earthquakes: List[Dict],
+    earthquakes: Union[List[Dict], Columns, YearlyStats],
     *,
     show: bool = True,
     savepath: Optional[str] = "quakes_count_per_year.png",
+    force: bool = False,
+    dpi: int = 100,
 ):
-    """Plot frequency (count) of earthquakes per year; show and/or save."""
-    by_year = defaultdict(int)
-    for eq in earthquakes:
-        try:
-            y = get_year(eq)
-        except Exception:
-            continue
-        by_year[y] += 1
+    """
+    Plot frequency (count) of earthquakes per year; show and/or save.
 
-    years = sorted(by_year.keys())
-    counts = [by_year[y] for y in years]
+    Pass the result of ``aggregate`` to reuse one pass over the events across both plots.
 
-    fig, ax = plt.subplots(figsize=(8, 4.8))
-    ax.bar(years, counts)
-    ax.set_title("Number of Earthquakes per Year")
-    ax.set_xlabel("Year")
-    ax.set_ylabel("Count")
-   
-    ax.xaxis.set_major_locator(MaxNLocator(integer=True))
-    fig.tight_layout()
+    Saving is the expensive part, so a file previously rendered from the same counts
+    (in the same format) is copied from ``.plotcache/`` instead; ``force=True`` re-renders.
+    Raise ``dpi`` (e.g. to 300) for print-quality output.
+    """
+    years, counts, _ = _as_stats(earthquakes)
+    with plt.style.context("fast"):
+        fig, ax = _new_figure(show)
+        ax.bar(years, counts)
+        ax.set_title("Number of Earthquakes per Year")
+        ax.set_xlabel("Year")
+        ax.set_ylabel("Count")
+        ax.xaxis.set_major_locator(MaxNLocator(integer=True))
+        fig.subplots_adjust(left=0.1, right=0.98, top=0.92, bottom=0.12)
+
+        if savepath:
+            cached = _plot_cache_path(f"count@{dpi}", savepath, years, counts)
+            _save_plot(fig, savepath, cached, dpi, force)
 
-    if savepath:
-        fig.savefig(savepath, dpi=150, bbox_inches="tight")  
-    if show:  
+    if show:
         plt.show()
     return fig, ax
 
 def plot_average_magnitude_per_year(
-     earthquakes: List[Dict],
+    earthquakes: Union[List[Dict], Columns, YearlyStats],
     *,
     show: bool = True,
     savepath: Optional[str] = "quakes_avg_mag_per_year.png",
+    force: bool = False,
+    dpi: int = 100,
 ):
-    """Plot average magnitude per year (ignoring missing magnitudes)."""
-    mags_by_year = get_magnitudes_per_year(earthquakes)
-
-    years = sorted(mags_by_year.keys())
-    avgs = []
-    for y in years:
-        mags = [m for m in mags_by_year[y] if not isnan(m)]
-        avgs.append(sum(mags) / len(mags) if mags else float("nan"))
-
-    fig, ax = plt.subplots(figsize=(8, 4.8))
-    ax.plot(years, avgs, marker="o")
-    ax.set_title("Average Magnitude per Year")
-    ax.set_xlabel("Year")
-    ax.set_ylabel("Average magnitude")
-    ax.xaxis.set_major_locator(MaxNLocator(integer=True))
-    fig.tight_layout()
-
-    if savepath:
-        fig.savefig(savepath, dpi=150, bbox_inches="tight")
+    """
+    Plot average magnitude per year (ignoring missing magnitudes).
+
+    Accepts ``aggregate`` output and reuses cached renders like ``plot_number_per_year``.
+    """
+    years, _, avgs = _as_stats(earthquakes)
+    with plt.style.context("fast"):
+        fig, ax = _new_figure(show)
+        ax.plot(years, avgs, marker="o")
+        ax.set_title("Average Magnitude per Year")
+        ax.set_xlabel("Year")
+        ax.set_ylabel("Average magnitude")
+        ax.xaxis.set_major_locator(MaxNLocator(integer=True))
+        fig.subplots_adjust(left=0.1, right=0.98, top=0.92, bottom=0.12)
+
+        if savepath:
+            cached = _plot_cache_path(f"average@{dpi}", savepath, years, avgs)
+            _save_plot(fig, savepath, cached, dpi, force)
+
     if show:
         plt.show()
     return fig, ax
@@ -202,12 +793,15 @@ def plot_average_magnitude_per_year(
 
 if __name__ == "__main__":
     data = get_data()
-    quakes = data["features"]
     print(f"Loaded {count_earthquakes(data)} earthquakes")
- 
-    plot_number_per_year(quakes, show=True, savepath="quakes_count_per_year.png")
-    
+    max_magnitude, max_location = get_maximum(data)
+    print(f"The strongest earthquake was at {max_location} with magnitude {max_magnitude}")
+
+    stats = aggregate(data["features"])
+
+    plot_number_per_year(stats, show=True, savepath="quakes_count_per_year.png")
+
     plt.clf()
 
-    plot_average_magnitude_per_year(quakes, show=True, savepath="quakes_avg_mag_per_year.png")
+    plot_average_magnitude_per_year(stats, show=True, savepath="quakes_avg_mag_per_year.png")
 
@@ -0,0 +1,355 @@
+import json
+
+import numpy as np
+import pytest
+import requests
+from matplotlib.figure import Figure
+
+import earthquakes
+from earthquakes import _select, _time_ms, _union_query, to_columns
+
+
+def _feature(mag, ts_ms, lat, lon):
+    return {
+        "properties": {"mag": mag, "time": ts_ms},
+        "geometry": {"coordinates": [lon, lat, 10.0]},
+    }
+
+
+def test_union_requires_every_starttime():
+    queries = [
+        {"starttime": "2010-01-01", "endtime": "2011-01-01"},
+        {"endtime": "2012-01-01"},
+    ] * 2
+    assert _union_query(queries) is None
+
+
+def test_union_widens_ranges():
+    queries = [
+        {"starttime": "2010-01-01", "endtime": "2011-01-01", "minlatitude": "50", "maxlatitude": "55"},
+        {"starttime": "2010-06-01", "endtime": "2011-06-01", "minlatitude": "52", "maxlatitude": "58"},
+    ]
+    union = _union_query(queries)
+    assert union == {
+        "starttime": "2010-01-01",
+        "endtime": "2011-06-01",
+        "minlatitude": "50",
+        "maxlatitude": "58",
+    }
+
+
+def test_union_refuses_differing_fixed_params():
+    queries = [
+        {"starttime": "2010-01-01", "format": "geojson"},
+        {"starttime": "2010-01-01", "format": "text"},
+    ]
+    assert _union_query(queries) is None
+
+
+def test_union_refuses_large_overfetch():
+    # Same small box in 2000 and 2018: the union would span 19 years for two.
+    box = {"minlatitude": "50", "maxlatitude": "51", "minlongitude": "0", "maxlongitude": "1"}
+    queries = [
+        {**box, "starttime": "2000-01-01", "endtime": "2001-01-01"},
+        {**box, "starttime": "2018-01-01", "endtime": "2019-01-01"},
+    ]
+    assert _union_query(queries) is None
+
+
+def test_time_ms_accepts_zulu_suffix():
+    assert _time_ms("2000-01-01T00:00:00Z") == _time_ms("2000-01-01") == 946684800000
+
+
+def test_select_applies_bounds():
+    t0 = _time_ms("2010-01-01")
+    columns = to_columns(
+        [
+            _feature(2.0, t0, 51.0, 0.5),
+            _feature(0.5, t0, 51.0, 0.5),  # below minmagnitude
+            _feature(2.0, t0, 60.0, 0.5),  # outside latitude range
+            _feature(2.0, _time_ms("2012-01-01"), 51.0, 0.5),  # after endtime
+        ]
+    )
+    query = {
+        "starttime": "2010-01-01",
+        "endtime": "2011-01-01",
+        "minlatitude": "50",
+        "maxlatitude": "55",
+        "minmagnitude": "1",
+    }
+    np.testing.assert_array_equal(_select(columns, query), [0])
+
+
+def test_select_handles_dateline_crossing():
+    t0 = _time_ms("2010-01-01")
+    columns = to_columns(
+        [
+            _feature(2.0, t0, 0.0, 175.0),
+            _feature(2.0, t0, 0.0, -175.0),
+            _feature(2.0, t0, 0.0, 0.0),
+        ]
+    )
+    query = {"starttime": "2010-01-01", "minlongitude": "170", "maxlongitude": "190"}
+    np.testing.assert_array_equal(_select(columns, query), [0, 1])
+
+
+def test_union_refuses_limit_and_offset():
+    for key in ("limit", "offset"):
+        queries = [{"starttime": "2010-01-01", key: "100"}] * 2
+        assert _union_query(queries) is None
+
+
+def _batch_queries():
+    box = {"minlatitude": "50", "maxlatitude": "55", "minlongitude": "-5", "maxlongitude": "0"}
+    return [
+        {**box, "starttime": f"2010-0{m}-01", "endtime": f"2010-0{m + 1}-01"} for m in range(1, 5)
+    ]
+
+
+def _collection(features, **metadata):
+    return {"type": "FeatureCollection", "metadata": metadata, "features": features}
+
+
+def test_get_data_batch_small_batches_go_one_by_one(monkeypatch):
+    calls = []
+    monkeypatch.setattr(earthquakes, "_fetch_query", lambda q: calls.append(q) or _collection([]))
+    queries = _batch_queries()[:3]
+    results = earthquakes.get_data_batch(queries)
+    assert calls == queries
+    assert len(results) == 3
+
+
+def test_get_data_batch_falls_back_when_union_fails(monkeypatch):
+    calls = []
+
+    def fetch(q):
+        calls.append(q)
+        if len(calls) == 1:
+            raise requests.HTTPError("400 Client Error: too many events")
+        return _collection([])
+
+    monkeypatch.setattr(earthquakes, "_fetch_query", fetch)
+    queries = _batch_queries()
+    earthquakes.get_data_batch(queries)
+    assert calls[1:] == queries
+
+
+def test_get_data_batch_splits_union_per_query(monkeypatch):
+    queries = _batch_queries()
+    features = [
+        _feature(2.0, _time_ms(f"2010-0{m}-15"), 52.0, -1.0) for m in (1, 2, 2, 3, 4, 4, 4)
+    ]
+    unions = []
+
+    def fetch(q):
+        unions.append(q)
+        return _collection(features, count=len(features), title="USGS Earthquakes")
+
+    monkeypatch.setattr(earthquakes, "_fetch_query", fetch)
+    results = earthquakes.get_data_batch(queries)
+
+    assert len(unions) == 1
+    assert [r["metadata"]["count"] for r in results] == [1, 2, 1, 3]
+    assert [len(r["features"]) for r in results] == [1, 2, 1, 3]
+    for q, r in zip(queries, results):
+        assert r["metadata"]["url"] == earthquakes._query_url(q)
+        assert r["metadata"]["title"] == "USGS Earthquakes"
+
+
+def _count_renders(monkeypatch, tmp_path):
+    monkeypatch.setattr(earthquakes, "PLOT_CACHE_DIR", tmp_path / "plotcache")
+    renders = []
+    savefig = Figure.savefig
+
+    def counting_savefig(self, *args, **kwargs):
+        renders.append(args[0])
+        return savefig(self, *args, **kwargs)
+
+    monkeypatch.setattr(Figure, "savefig", counting_savefig)
+    return renders
+
+
+def _stats():
+    return earthquakes.YearlyStats(np.array([2000, 2001]), np.array([3, 5]), np.array([2.1, 2.4]))
+
+
+def test_plot_cache_reuses_identical_save(monkeypatch, tmp_path):
+    renders = _count_renders(monkeypatch, tmp_path)
+    first, second = tmp_path / "a.png", tmp_path / "b.png"
+    earthquakes.plot_number_per_year(_stats(), show=False, savepath=str(first))
+    fig, ax = earthquakes.plot_number_per_year(_stats(), show=False, savepath=str(second))
+    assert renders == [str(first)]
+    assert second.read_bytes() == first.read_bytes()
+    assert fig is not None and ax is not None
+
+
+def test_plot_cache_force_and_format_rerender(monkeypatch, tmp_path):
+    renders = _count_renders(monkeypatch, tmp_path)
+    png, forced, pdf = tmp_path / "a.png", tmp_path / "b.png", tmp_path / "c.pdf"
+    earthquakes.plot_number_per_year(_stats(), show=False, savepath=str(png))
+    earthquakes.plot_number_per_year(_stats(), show=False, savepath=str(forced), force=True)
+    earthquakes.plot_number_per_year(_stats(), show=False, savepath=str(pdf))
+    assert renders == [str(png), str(forced), str(pdf)]
+    assert pdf.read_bytes().startswith(b"%PDF")
+
+
+def test_plot_cache_key_tracks_render_version(monkeypatch):
+    args = ("count@100", "a.png", np.array([2000]), np.array([1]))
+    before = earthquakes._plot_cache_path(*args)
+    monkeypatch.setattr(earthquakes, "_PLOT_RENDER_VERSION", earthquakes._PLOT_RENDER_VERSION + 1)
+    assert earthquakes._plot_cache_path(*args) != before
+
+
+class _FakeResponse:
+    def __init__(self, status_code, content=b"", etag=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {"ETag": etag} if etag else {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+
+_BODY = b'{"type": "FeatureCollection", "metadata": {"count": 0}, "features": []}'
+
+
+def _fake_usgs(monkeypatch, tmp_path, *responses):
+    """Serve ``responses`` in order from the shared session; returns the request headers seen."""
+    monkeypatch.setattr(earthquakes, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(earthquakes, "aiohttp", None)
+    queue, seen = list(responses), []
+
+    def get(url, params=None, headers=None, timeout=None):
+        seen.append(headers)
+        return queue.pop(0)
+
+    monkeypatch.setattr(earthquakes._SESSION, "get", get)
+    return seen
+
+
+def test_fetch_body_caches_download_and_etag(monkeypatch, tmp_path):
+    _fake_usgs(monkeypatch, tmp_path, _FakeResponse(200, _BODY, etag='"v1"'))
+    content, data = earthquakes._fetch_body()
+    assert content == _BODY and data["features"] == []
+    body_path, etag_path = earthquakes._cache_paths(earthquakes.USGS_PARAMS)
+    assert body_path.read_bytes() == _BODY
+    assert etag_path.read_text() == '"v1"'
+
+
+def test_fetch_body_cache_hit_skips_network(monkeypatch, tmp_path):
+    seen = _fake_usgs(monkeypatch, tmp_path, _FakeResponse(200, _BODY))
+    earthquakes._fetch_body()
+    assert earthquakes._fetch_body() == (_BODY, None)
+    assert len(seen) == 1
+
+
+def test_fetch_body_reuses_cache_on_304(monkeypatch, tmp_path):
+    seen = _fake_usgs(
+        monkeypatch, tmp_path, _FakeResponse(200, _BODY, etag='"v1"'), _FakeResponse(304)
+    )
+    earthquakes._fetch_body()
+    assert earthquakes._fetch_body(refresh=True) == (_BODY, None)
+    assert seen[-1] == {"If-None-Match": '"v1"'}
+
+
+def test_fetch_body_does_not_cache_malformed_body(monkeypatch, tmp_path):
+    _fake_usgs(monkeypatch, tmp_path, _FakeResponse(200, b'{"type": "Feat'))
+    with pytest.raises(ValueError):
+        earthquakes._fetch_body()
+    body_path, _ = earthquakes._cache_paths(earthquakes.USGS_PARAMS)
+    assert not body_path.exists()
+
+
+def test_fetch_body_unlinks_stale_etag(monkeypatch, tmp_path):
+    _fake_usgs(
+        monkeypatch, tmp_path, _FakeResponse(200, _BODY, etag='"v1"'), _FakeResponse(200, _BODY)
+    )
+    earthquakes._fetch_body()
+    earthquakes._fetch_body(refresh=True)
+    _, etag_path = earthquakes._cache_paths(earthquakes.USGS_PARAMS)
+    assert not etag_path.exists()
+
+
+def test_get_columns_msgspec_matches_to_columns(monkeypatch):
+    pytest.importorskip("msgspec")
+    body = json.dumps(
+        {
+            "type": "FeatureCollection",
+            "features": [
+                _feature(2.5, 946684800000, 51.5, -0.1),
+                _feature(3, 946684800001, 52.0, 1.0),  # integer magnitude
+                _feature(None, 946684800002, 53.0, 2.0),  # null magnitude
+                {"properties": {"mag": 1.5, "time": 946684800003}, "geometry": None},
+                {"properties": {"mag": 1.5}, "geometry": {"coordinates": [1.0]}},
+                {"properties": None, "geometry": {"coordinates": [1.0, 2.0]}},
+                {"properties": {"mag": 1.0, "time": 946684800004}, "geometry": {"coordinates": None}},
+            ],
+        }
+    ).encode()
+    monkeypatch.setattr(earthquakes, "_fetch_body", lambda refresh=False: (body, None))
+
+    expected = to_columns(json.loads(body)["features"])
+    actual = earthquakes.get_columns()
+    for field in earthquakes.Columns._fields:
+        np.testing.assert_array_equal(getattr(actual, field), getattr(expected, field))
+
+
+def test_aggregate_fills_gap_years():
+    features = [
+        _feature(2.0, _time_ms("2001-06-01"), 51.0, 0.0),
+        _feature(3.0, _time_ms("2003-06-01"), 51.0, 0.0),
+        _feature(4.0, _time_ms("2003-07-01"), 51.0, 0.0),
+    ]
+    stats = earthquakes.aggregate(features)
+    np.testing.assert_array_equal(stats.years, [2001, 2002, 2003])
+    np.testing.assert_array_equal(stats.counts, [1, 0, 2])
+    np.testing.assert_array_equal(stats.means, [2.0, np.nan, 3.5])
+
+
+def test_aggregate_all_nan_year_counts_events_but_has_nan_mean():
+    features = [
+        _feature(None, _time_ms("2001-06-01"), 51.0, 0.0),
+        _feature(None, _time_ms("2001-07-01"), 51.0, 0.0),
+        _feature(2.5, _time_ms("2002-06-01"), 51.0, 0.0),
+    ]
+    stats = earthquakes.aggregate(features)
+    np.testing.assert_array_equal(stats.counts, [2, 1])
+    np.testing.assert_array_equal(stats.means, [np.nan, 2.5])
+
+
+def test_aggregate_buckets_by_utc_year():
+    new_year = _time_ms("2001-01-01T00:00:00Z")
+    features = [
+        _feature(2.0, new_year - 1, 51.0, 0.0),
+        _feature(3.0, new_year, 51.0, 0.0),
+    ]
+    stats = earthquakes.aggregate(features)
+    np.testing.assert_array_equal(stats.years, [2000, 2001])
+    np.testing.assert_array_equal(stats.counts, [1, 1])
+    assert earthquakes.get_year(features[1]) == 2001
+
+
+def _group_inputs():
+    rng = np.random.default_rng(0)
+    offsets = rng.integers(0, 5, size=200)
+    mags = rng.uniform(1, 5, size=200)
+    mags[::7] = np.nan
+    offsets[offsets == 3] = 2  # leave bin 3 empty
+    return offsets, mags, ~np.isnan(mags), 6
+
+
+@pytest.mark.parametrize(
+    "kernel",
+    [
+        earthquakes._group_sum_count_loop,
+        pytest.param(
+            earthquakes._group_sum_count,
+            marks=pytest.mark.skipif(earthquakes.njit is None, reason="numba not installed"),
+        ),
+    ],
+)
+def test_group_sum_count_matches_bincount(kernel):
+    args = _group_inputs()
+    for got, want in zip(kernel(*args), earthquakes._group_sum_count_bincount(*args)):
+        np.testing.assert_allclose(got, want)